@@ -15,98 +15,16 @@
 # specific language governing permissions and limitations
 # under the License.
 
-import os
+import sys
+import pytest
 import tvm
 import numpy as np
 from tvm import relay
-from tvm.relay import testing
-from tvm.relay.transform import recast
-from tvm.relay.transform import recast
-from tvm.contrib import graph_runtime
-
-def get_reference(mod, params1, input_shape, inputs):
-    mod_fp32 = recast(mod, "float32", "float32", ops = ["nn.conv2d", "add", "nn.relu"])
-    with relay.build_config(opt_level=3):
-        graph, lib, params = relay.build(
-            mod_fp32, "llvm", params=params1
-        )
-    ctx = tvm.cpu()
-    m = graph_runtime.create(graph, lib, ctx)
-    if isinstance(input_shape, dict):
-        for key in input_shape:
-            m.set_input(key, inputs[-1])
-    else:
-        m.set_input("data", inputs[-1])
-    m.set_input(**params)
-    m.run()
-    return [m.get_output(0).asnumpy(),]
-
-
-# build module run with opencl and cpu, compare results
-def build_run_compare(
-    tvm_mod,
-    params1,
-    input_shape,
-    dtype="float32",
-    target="llvm"):
-
-    rpc_tracker_host = os.environ["TVM_TRACKER_HOST"]
-    rpc_tracker_port = os.environ["TVM_TRACKER_PORT"]
-    if rpc_tracker_host:
-        run_on_host = 0
-        target_host = "llvm -mtriple=arm64-linux-android"
-        rpc_tracker_port = int(rpc_tracker_port)
-    else:
-        run_on_host = 1
-        target_host="llvm"
-
-    with relay.build_config(opt_level=3):
-        graph, lib, params = relay.build(
-            tvm_mod, target_host=target_host, target=target, params=params1
-        )
-    if run_on_host:
-        ctx = tvm.opencl()
-        m = graph_runtime.create(graph, lib, ctx)
-    else:
-        from tvm import rpc
-        from tvm.contrib import utils, ndk
-        rpc_key = "android"
-        tracker = rpc.connect_tracker(rpc_tracker_host, rpc_tracker_port)
-        remote = tracker.request(
-            rpc_key, priority=0, session_timeout=600
-        )
-        temp = utils.tempdir()
-        dso_binary = "dev_lib_cl.so"
-        dso_binary_path = temp.relpath(dso_binary)
-        ctx = remote.cl(0)
-        lib.export_library(dso_binary_path, ndk.create_shared)
-        remote.upload(dso_binary_path)
-        rlib = remote.load_module(dso_binary)
-        m = graph_runtime.create(graph, rlib, ctx)
-    m.set_input(**params)
-    inputs = []
-    if isinstance(input_shape, dict):
-        for key in input_shape:
-            inputs.append(np.random.normal(size=input_shape[key]).astype(dtype))
-            m.set_input(key, inputs[-1])
-    else:
-        inputs.append(np.random.normal(size=input_shape).astype(dtype))
-        m.set_input("data", inputs[-1])
-    m.run()
-
-    ref_outputs = get_reference(tvm_mod, params1, input_shape, inputs)
-    for i, ref_output in enumerate(ref_outputs):
-        tvm_output = m.get_output(i)
-        output = tvm_output.asnumpy()
-        # for index, x in np.ndenumerate(ref_output):
-        #     if abs(output[index] - x) > 0.01:
-        #         print(index, output[index], x)
-
-        np.testing.assert_allclose(output, ref_output, rtol=1e-2, atol=1e-2)
+from utils.texture_utils import build_run_compare, get_xavier, remote_session
 
 
 def test_conv2d_deeplabv3_1_257_257_32x1_1_32_16():
-    target="opencl --device=adreno"
+    target = tvm.target.adreno()
     dtype="float16"
 
     input_shape = (1, 257, 257, 32)
@@ -123,22 +41,16 @@ def test_conv2d_deeplabv3_1_257_257_32x1_1_32_16():
     D = relay.op.nn.relu(D)
 
     mod = relay.Function([A, B, bias], D)
-    np.random.seed(1)
-    initializer = relay.testing.init.Xavier()
-    filter_data = np.zeros(filter_shape).astype(dtype)
-    bias_data = np.zeros(bias_shape).astype(dtype)
-    initializer("weight", filter_data)
-    initializer("bias", bias_data)
     params1 = {
-        "weight": tvm.nd.array(filter_data),
-        "bias": tvm.nd.array(bias_data),
+        "weight": get_xavier(filter_shape, dtype, seed=1),
+        "bias": tvm.nd.array(np.zeros(bias_shape, dtype=dtype)),
     }
 
     build_run_compare(mod, params1, {"data": input_shape}, dtype, target)
 
 
 def test_conv2d_deeplabv3_1_257_257_32x1_1_32_16_with_padding():
-    target="opencl --device=adreno"
+    target = tvm.target.adreno()
     dtype="float16"
 
     input_shape = (1, 257, 257, 32)
@@ -156,23 +68,16 @@ def test_conv2d_deeplabv3_1_257_257_32x1_1_32_16_with_padding():
     D = relay.op.nn.relu(D)
 
     mod = relay.Function([A, B, bias], D)
-    # mod, params = relay.testing.init.create_workload(func)
-    np.random.seed(1)
-    initializer = relay.testing.init.Xavier()
-    filter_data = np.zeros(filter_shape).astype(dtype)
-    bias_data = np.zeros(bias_shape).astype(dtype)
-    initializer("weight", filter_data)
-    initializer("bias", bias_data)
     params1 = {
-        "weight": tvm.nd.array(filter_data),
-        "bias" : tvm.nd.array(bias_data),
+        "weight": get_xavier(filter_shape, dtype, seed=1),
+        "bias": tvm.nd.array(np.zeros(bias_shape, dtype=dtype)),
     }
 
     build_run_compare(mod, params1, {"data": input_shape}, dtype, target)
 
 
 def test_conv2d_4_35_35_32x3_3_144_16():
-    target="opencl --device=adreno"
+    target = tvm.target.adreno()
     dtype="float16"
 
     input_shape = (4, 35, 35, 32)
@@ -190,22 +95,16 @@ def test_conv2d_4_35_35_32x3_3_144_16():
     D = relay.op.nn.relu(D)
 
     mod = relay.Function([A, B, bias], D)
-    np.random.seed(1)
-    initializer = relay.testing.init.Xavier()
-    filter_data = np.zeros(filter_shape).astype(dtype)
-    bias_data = np.zeros(bias_shape).astype(dtype)
-    initializer("weight", filter_data)
-    initializer("bias", bias_data)
     params1 = {
-        "weight": tvm.nd.array(filter_data),
-        "bias": tvm.nd.array(bias_data),
+        "weight": get_xavier(filter_shape, dtype, seed=1),
+        "bias": tvm.nd.array(np.zeros(bias_shape, dtype=dtype)),
     }
 
     build_run_compare(mod, params1, {"data": input_shape}, dtype, target)
 
 
 def test_depthwise_conv2d_deeplabv3_1_129_129_144x3_3_144_1():
-    target="opencl --device=adreno"
+    target = tvm.target.adreno()
     dtype="float16"
 
     input_shape = (1, 129, 129, 144)
@@ -224,22 +123,16 @@ def test_depthwise_conv2d_deeplabv3_1_129_129_144x3_3_144_1():
 
     mod = relay.Function([A, B, bias], D)
     mod = relay.Function([A, B, bias], conv)
-    np.random.seed(1)
-    initializer = relay.testing.init.Xavier()
-    filter_data = np.zeros(filter_shape).astype(dtype)
-    bias_data = np.zeros(bias_shape).astype(dtype)
-    initializer("weight", filter_data)
-    initializer("bias", bias_data)
     params1 = {
-        "weight": tvm.nd.array(filter_data),
-        "bias": tvm.nd.array(bias_data),
+        "weight": get_xavier(filter_shape, dtype, seed=1),
+        "bias": tvm.nd.array(np.zeros(bias_shape, dtype=dtype)),
     }
 
     build_run_compare(mod, params1, {"data": input_shape}, dtype, target)
 
 
 def test_depthwise_conv2d_deeplabv3_4_35_35_576x3_3_576_1():
-    target="opencl --device=adreno"
+    target = tvm.target.adreno()
     dtype="float16"
 
     input_shape = (4, 35, 35, 576)
@@ -258,22 +151,16 @@ def test_depthwise_conv2d_deeplabv3_4_35_35_576x3_3_576_1():
 
     mod = relay.Function([A, B, bias], D)
     mod = relay.Function([A, B, bias], conv)
-    np.random.seed(1)
-    initializer = relay.testing.init.Xavier()
-    filter_data = np.zeros(filter_shape).astype(dtype)
-    bias_data = np.zeros(bias_shape).astype(dtype)
-    initializer("weight", filter_data)
-    initializer("bias", bias_data)
     params1 = {
-        "weight": tvm.nd.array(filter_data),
-        "bias": tvm.nd.array(bias_data),
+        "weight": get_xavier(filter_shape, dtype, seed=1),
+        "bias": tvm.nd.array(np.zeros(bias_shape, dtype=dtype)),
     }
 
     build_run_compare(mod, params1, {"data": input_shape}, dtype, target)
 
 
 def test_depthwise_conv2d_deeplabv3_1_129_129_144x3_3_144_1_with_padding():
-    target="opencl --device=adreno"
+    target = tvm.target.adreno()
     dtype="float16"
 
     input_shape = (1, 129, 129, 144)
@@ -292,23 +179,16 @@ def test_depthwise_conv2d_deeplabv3_1_129_129_144x3_3_144_1_with_padding():
     D = relay.op.nn.relu(D)
 
     mod = relay.Function([A, B, bias], D)
-    # mod, params = relay.testing.init.create_workload(func)
-    np.random.seed(1)
-    initializer = relay.testing.init.Xavier()
-    filter_data = np.zeros(filter_shape).astype(dtype)
-    bias_data = np.zeros(bias_shape).astype(dtype)
-    initializer("weight", filter_data)
-    initializer("bias", bias_data)
     params1 = {
-        "weight": tvm.nd.array(filter_data),
-        "bias" : tvm.nd.array(bias_data),
+        "weight": get_xavier(filter_shape, dtype, seed=1),
+        "bias": tvm.nd.array(np.zeros(bias_shape, dtype=dtype)),
     }
 
     build_run_compare(mod, params1, {"data": input_shape}, dtype, target)
 
 
 def test_conv2d_deeplabv3_1_513_513_3x3_3_3_32():
-    target="opencl --device=adreno"
+    target = tvm.target.adreno()
     dtype="float16"
 
     input_shape = (1, 513, 513, 3)
@@ -326,25 +206,13 @@ def test_conv2d_deeplabv3_1_513_513_3x3_3_3_32():
     D = relay.op.nn.relu(D)
 
     mod = relay.Function([A, B, bias], D)
-    np.random.seed(1)
-    initializer = relay.testing.init.Xavier()
-    filter_data = np.ones(filter_shape).astype(dtype)
-    bias_data = np.ones(bias_shape).astype(dtype)
-    initializer("weight", filter_data)
-    initializer("bias", bias_data)
     params1 = {
-        "weight": tvm.nd.array(filter_data),
-        "bias": tvm.nd.array(bias_data),
+        "weight": get_xavier(filter_shape, dtype, seed=1),
+        "bias": tvm.nd.array(np.zeros(bias_shape, dtype=dtype)),
     }
 
     build_run_compare(mod, params1, {"data": input_shape}, dtype, target)
 
 
 if __name__ == "__main__":
-    test_conv2d_deeplabv3_1_257_257_32x1_1_32_16()
-    test_conv2d_deeplabv3_1_257_257_32x1_1_32_16_with_padding()
-    test_conv2d_4_35_35_32x3_3_144_16()
-    test_depthwise_conv2d_deeplabv3_1_129_129_144x3_3_144_1()
-    test_depthwise_conv2d_deeplabv3_1_129_129_144x3_3_144_1_with_padding()
-    test_depthwise_conv2d_deeplabv3_4_35_35_576x3_3_576_1()
-    test_conv2d_deeplabv3_1_513_513_3x3_3_3_32()
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
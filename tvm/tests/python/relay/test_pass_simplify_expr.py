@@ -14,6 +14,10 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
+import functools
+import itertools
+import sys
+import pytest
 import tvm
 from tvm import relay
 from tvm.relay import transform
@@ -22,6 +26,11 @@ from tvm.relay.testing import run_opt_pass
 import numpy as np
 
 
+@functools.lru_cache(maxsize=None)
+def _const(value, dtype):
+    return relay.const(value, dtype)
+
+
 def test_simplify_reshape():
     def before():
         x = relay.var("x", shape=(1, 16, 16, 16), dtype="float32")
@@ -60,7 +69,7 @@ def test_simplify_reshape():
     assert tvm.ir.structural_equal(zz, after)
 
 
-def test_simplify_transpose():
+def _simplify_transpose_cases():
     # Test a series of transpose and layout_transform ops
     def before1():
         x = relay.var("x", shape=(1, 3, 224, 224), dtype="float32")  # NCHW
@@ -200,90 +209,95 @@ def test_simplify_transpose():
         y = relay.nn.relu(y)
         return relay.Function([x], y)
 
-    for before, expected in [
-        [before1(), expected1()],
-        [before2(), expected2()],
-        [before3(), expected3()],
-        [before4(), expected4()],
-        [before5(), expected5()],
-        [before6(), expected6()],
-        [before7(), expected7()],
-        [before8(), expected8()],
-        [before9(), expected9()],
-        [before10(), expected10()],
-    ]:
-        after = run_opt_pass(before, transform.SimplifyExpr())
-        expected = run_opt_pass(expected, transform.InferType())
-        assert tvm.ir.structural_equal(after, expected), "\nafter: {} \nexpected: {}".format(
-            after, expected
-        )
-
-
-def test_simplify_full_elementwise():
+    return [
+        (before1, expected1),
+        (before2, expected2),
+        (before3, expected3),
+        (before4, expected4),
+        (before5, expected5),
+        (before6, expected6),
+        (before7, expected7),
+        (before8, expected8),
+        (before9, expected9),
+        (before10, expected10),
+    ]
+
+
+@pytest.mark.parametrize(
+    "before, expected", _simplify_transpose_cases(), ids=lambda case: case.__name__
+)
+def test_simplify_transpose(before, expected):
+    after = run_opt_pass(before(), transform.SimplifyExpr())
+    expected = run_opt_pass(expected(), transform.InferType())
+    assert tvm.ir.structural_equal(after, expected), "\nafter: {} \nexpected: {}".format(
+        after, expected
+    )
+
+
+@pytest.mark.parametrize(
+    "shape, dtype, value",
+    list(
+        itertools.product([[10], [10, 10], [10, 10, 10]], ["float32", "int32", "bool"], [0, 1, 2])
+    ),
+)
+def test_simplify_full_elementwise(shape, dtype, value):
     def validate(shape, value, dtype):
         def before_left(x, elem_op, full):
             return elem_op(full, x)
 
         def after_left(x, elem_op, value):
-            return elem_op(relay.const(value, dtype), x)
+            return elem_op(_const(value, dtype), x)
 
         def before_right(x, elem_op, full):
             return elem_op(x, full)
 
         def after_right(x, elem_op, value):
-            return elem_op(x, relay.const(value, dtype))
+            return elem_op(x, _const(value, dtype))
 
         x = relay.var("x", shape=shape, dtype=dtype)
         elem_ops = [relay.add, relay.multiply, relay.subtract, relay.divide]
+        # factories rather than nodes: the rewrite skips a full op that has
+        # consumers outside its match, so every tuple field needs its own
         full_ops = []
         if value == 0:
-            full_ops.append(relay.zeros(shape, dtype))
-            full_ops.append(relay.zeros_like(x))
+            full_ops.append(lambda: relay.zeros(shape, dtype))
+            full_ops.append(lambda: relay.zeros_like(x))
         if value == 1:
-            full_ops.append(relay.ones(shape, dtype))
-            full_ops.append(relay.ones_like(x))
+            full_ops.append(lambda: relay.ones(shape, dtype))
+            full_ops.append(lambda: relay.ones_like(x))
         else:
-            full_ops.append(relay.full(relay.const(value, dtype), shape))
-            full_ops.append(relay.full_like(x, relay.const(value, dtype)))
+            full_ops.append(lambda: relay.full(_const(value, dtype), shape))
+            full_ops.append(lambda: relay.full_like(x, _const(value, dtype)))
+        before, expected = [], []
         for op in elem_ops:
             for full in full_ops:
-                z = before_left(x, op, full)
-                zz = run_opt_pass(z, transform.SimplifyExpr())
-                after = run_opt_pass(after_left(x, op, value), transform.InferType())
-                assert tvm.ir.structural_equal(zz, after)
-
-                z = before_right(x, op, full)
-                zz = run_opt_pass(z, transform.SimplifyExpr())
-                after = run_opt_pass(after_right(x, op, value), transform.InferType())
-                assert tvm.ir.structural_equal(zz, after)
+                before.append(before_left(x, op, full()))
+                expected.append(after_left(x, op, value))
+                before.append(before_right(x, op, full()))
+                expected.append(after_right(x, op, value))
 
         # Test the case in which x is broadcast to full's shape
         full_ops = []
         if value == 0:
-            full_ops.append(relay.zeros(shape * 2, dtype))
+            full_ops.append(lambda: relay.zeros(shape * 2, dtype))
         if value == 1:
-            full_ops.append(relay.ones(shape * 2, dtype))
+            full_ops.append(lambda: relay.ones(shape * 2, dtype))
         else:
-            full_ops.append(relay.full(relay.const(value, dtype), shape * 2))
+            full_ops.append(lambda: relay.full(_const(value, dtype), shape * 2))
         for op in elem_ops:
             for full in full_ops:
-                z = before_left(x, op, full)
-                zz = run_opt_pass(z, transform.SimplifyExpr())
-                after = run_opt_pass(before_left(x, op, full), transform.InferType())
-                assert tvm.ir.structural_equal(zz, after)
+                before.append(before_left(x, op, full()))
+                expected.append(before_left(x, op, full()))
+                before.append(before_right(x, op, full()))
+                expected.append(before_right(x, op, full()))
 
-                z = before_right(x, op, full)
-                zz = run_opt_pass(z, transform.SimplifyExpr())
-                after = run_opt_pass(before_right(x, op, full), transform.InferType())
-                assert tvm.ir.structural_equal(zz, after)
+        # Run SimplifyExpr once over a tuple holding every variant
+        zz = run_opt_pass(relay.Function([x], relay.Tuple(before)), transform.SimplifyExpr())
+        after = run_opt_pass(relay.Function([x], relay.Tuple(expected)), transform.InferType())
+        assert tvm.ir.structural_equal(zz, after), "\nafter: {} \nexpected: {}".format(zz, after)
 
-    for shape in [[10], [10, 10], [10, 10, 10]]:
-        for dtype in ["float32", "int32", "bool"]:
-            for value in [0, 1, 2]:
-                validate(shape, value, dtype)
+    validate(shape, value, dtype)
 
 
 if __name__ == "__main__":
-    test_simplify_reshape()
-    test_simplify_transpose()
-    test_simplify_full_elementwise()
+    sys.exit(pytest.main([__file__] + sys.argv[1:]))
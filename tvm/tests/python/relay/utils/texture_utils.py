@@ -0,0 +1,271 @@
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+# Shared build/run/check helpers for the conv2d texture tests.
+import functools
+import hashlib
+import os
+import zlib
+import pytest
+import tvm
+import numpy as np
+from tvm import relay
+from tvm.relay import testing
+from tvm.relay.transform import recast
+from tvm.contrib import graph_runtime, utils
+from tvm.contrib.download import TEST_DATA_ROOT_PATH
+from tvm import autotvm
+
+# random inputs seeded by name and shape, so they do not depend on test order
+_INPUTS = {}
+
+
+def _random_normal(name, shape, dtype):
+    key = (name, tuple(shape), dtype)
+    if key not in _INPUTS:
+        seed = [zlib.crc32(name.encode())] + list(shape)
+        if hasattr(np.random, "default_rng"):
+            rng = np.random.default_rng(seed)
+            data = rng.standard_normal(size=shape, dtype=np.float32).astype(dtype, copy=False)
+        else:
+            data = np.random.RandomState(seed).standard_normal(size=shape).astype(dtype)
+        _INPUTS[key] = data
+    return _INPUTS[key]
+
+
+# fp32 reference builds, one per unique workload
+_REF_CACHE = {}
+# reference outputs saved across runs; TVM_TEST_REGEN_GOLDEN=1 rewrites them
+_GOLDEN_DIR = os.path.join(TEST_DATA_ROOT_PATH, "texture_golden")
+
+
+def get_reference(mod, input_shape, inputs, ops):
+    mod_hash = tvm.ir.structural_hash(mod)
+    digest = hashlib.sha1(tvm.__version__.encode())
+    digest.update(",".join(ops).encode())
+    digest.update(str(mod_hash).encode())
+    for key in sorted(inputs):
+        digest.update(key.encode())
+        digest.update(inputs[key].tobytes())
+    golden_path = os.path.join(_GOLDEN_DIR, digest.hexdigest() + ".npz")
+    regen = os.environ.get("TVM_TEST_REGEN_GOLDEN", "0") == "1"
+    if not regen and os.path.exists(golden_path):
+        with np.load(golden_path) as golden:
+            return [golden["arr_%d" % i] for i in range(len(golden.files))]
+
+    cache_key = (mod_hash, tuple(sorted(input_shape.items())), tuple(ops))
+    if cache_key not in _REF_CACHE:
+        # compute the listed ops in fp32, casting results back to the graph dtype
+        mod_fp32 = recast(mod, "float32", "float32", ops=list(ops))
+        with relay.build_config(opt_level=3):
+            graph, lib, params = relay.build(mod_fp32, "llvm")
+        _REF_CACHE[cache_key] = (graph, lib, params)
+    graph, lib, params = _REF_CACHE[cache_key]
+    ctx = tvm.cpu()
+    m = graph_runtime.create(graph, lib, ctx)
+    for key, data in inputs.items():
+        m.set_input(key, data)
+    m.set_input(**params)
+    m.run()
+    outputs = [m.get_output(0).asnumpy(),]
+
+    # write atomically so concurrent runs never read a partial file
+    os.makedirs(_GOLDEN_DIR, exist_ok=True)
+    tmp_path = "%s.%d.npz" % (golden_path[:-len(".npz")], os.getpid())
+    np.savez(tmp_path, *outputs)
+    os.replace(tmp_path, golden_path)
+    return outputs
+
+
+# kernel and output layouts of the conv2d in mod
+def _conv2d_layouts(mod):
+    layouts = []
+
+    def visit(expr):
+        if isinstance(expr, relay.Call) and getattr(expr.op, "name", None) == "nn.conv2d":
+            layouts.append((expr.attrs.kernel_layout, expr.attrs.out_layout or expr.attrs.data_layout))
+
+    relay.analysis.post_order_visit(mod, visit)
+    return layouts[0]
+
+
+# cheap default check; the fp32 reference only runs with TVM_TEST_FULL_REF=1
+def check_output_bounds(mod, params1, inputs, output):
+    ret_type = relay.transform.InferType()(tvm.IRModule.from_expr(mod))["main"].body.checked_type
+    assert output.shape == tuple(int(dim) for dim in ret_type.shape)
+    assert np.isfinite(output).all()
+
+    # |out[..., o, ...]| <= sum(|w[o]|) * max|x| + |bias[o]|
+    kernel_layout, out_layout = _conv2d_layouts(mod)
+    weight = np.abs(params1["weight"].asnumpy().astype("float32"))
+    weight = np.moveaxis(weight, kernel_layout.index("O"), 0)
+    bound = weight.reshape(weight.shape[0], -1).sum(axis=1)
+    bound *= max(np.abs(data.astype("float32")).max() for data in inputs.values())
+    if "bias" in params1:
+        bound += np.abs(params1["bias"].asnumpy().astype("float32")).reshape(-1)
+    bound_shape = [1] * output.ndim
+    bound_shape[out_layout.index("C")] = -1
+    bound = bound.reshape(bound_shape)
+    assert (np.abs(output.astype("float32")) <= bound * (1 + 1e-2) + 1e-2).all()
+
+
+# Xavier-initialized filters, shared by the tests that read them
+_WEIGHT_CACHE = {}
+
+
+def get_xavier(shape, dtype, seed):
+    key = (shape, dtype, seed)
+    if key not in _WEIGHT_CACHE:
+        np.random.seed(seed)
+        filter_data = np.empty(shape, dtype=dtype)
+        relay.testing.init.Xavier()("weight", filter_data)
+        _WEIGHT_CACHE[key] = tvm.nd.array(filter_data)
+    return _WEIGHT_CACHE[key]
+
+
+# device builds and the name of each exported library
+_BUILD_CACHE = {}
+_TEMP_DIR = utils.tempdir()
+# libraries uploaded over the session held by remote_session
+_UPLOADED = set()
+_REMOTE = None
+
+
+@pytest.fixture(scope="module", autouse=True)
+def remote_session():
+    """Hold one tracker session for a test module and release it afterwards."""
+    global _REMOTE
+    rpc_tracker_host = os.environ["TVM_TRACKER_HOST"]
+    if not rpc_tracker_host:
+        yield
+        return
+    from tvm import rpc
+    tracker = rpc.connect_tracker(rpc_tracker_host, int(os.environ["TVM_TRACKER_PORT"]))
+    # each xdist worker holds one device for the whole module
+    num_devices = sum(
+        item["key"].split(":")[1] == "android" for item in tracker.summary()["server_info"]
+    )
+    num_workers = int(os.environ.get("PYTEST_XDIST_WORKER_COUNT", "1"))
+    if num_workers > num_devices:
+        pytest.fail(
+            "%d pytest-xdist workers but only %d 'android' devices on the tracker; "
+            "run with -n %d or less" % (num_workers, num_devices, num_devices)
+        )
+    _REMOTE = tracker.request("android", priority=0, session_timeout=3600)
+    yield
+    # dropping the last reference closes the connection and frees the device
+    _REMOTE = None
+    _UPLOADED.clear()
+
+
+# spread pytest-xdist workers (gw0, gw1, ...) over the local OpenCL devices
+@functools.lru_cache(maxsize=None)
+def _opencl_device_id():
+    num_devices = 1
+    while tvm.opencl(num_devices).exist:
+        num_devices += 1
+    worker = os.environ.get("PYTEST_XDIST_WORKER", "gw0")
+    return int(worker[len("gw"):]) % num_devices
+
+
+# build module run with opencl and cpu, compare results
+def build_run_compare(
+    tvm_mod,
+    params1,
+    input_shape,
+    dtype="float32",
+    target="llvm",
+    json=None,
+    ref_ops=("nn.conv2d", "add", "nn.relu"),
+    desired_layouts=None):
+
+    rpc_tracker_host = os.environ["TVM_TRACKER_HOST"]
+    if rpc_tracker_host:
+        run_on_host = 0
+        target_host = "llvm -mtriple=arm64-linux-android"
+    else:
+        run_on_host = 1
+        target_host="llvm"
+        # let the OpenCL driver cache compiled kernels across runs
+        cl_cache_path = os.path.join(TEST_DATA_ROOT_PATH, "cl_cache")
+        os.makedirs(cl_cache_path, exist_ok=True)
+        os.environ.setdefault("CL_CACHE_PATH", cl_cache_path)
+        os.environ.setdefault("CL_CACHE_LEVEL", "2")
+
+    # bind the weights so they are folded (and pre-packed) at compile time
+    tvm_mod = relay.build_module.bind_params_by_name(tvm_mod, params1)
+    cache_key = (
+        tvm.ir.structural_hash(tvm_mod),
+        str(target),
+        target_host,
+        dtype,
+        json,
+        str(desired_layouts),
+    )
+    if cache_key not in _BUILD_CACHE:
+        if desired_layouts:
+            layout_config = relay.transform.LayoutConfig()
+            with layout_config:
+                seq = tvm.transform.Sequential(
+                    [relay.transform.ConvertLayout(desired_layouts), relay.transform.FoldConstant()]
+                )
+                with tvm.transform.PassContext(opt_level=3):
+                    build_mod = seq(tvm.IRModule.from_expr(tvm_mod))
+        else:
+            build_mod = tvm_mod
+        # an empty history (json=None) falls back to the default schedules
+        with autotvm.apply_history_best(json):
+            with relay.build_config(opt_level=3):
+                graph, lib, params = relay.build(
+                    build_mod, target_host=target_host, target=target
+                )
+        _BUILD_CACHE[cache_key] = (graph, lib, params, "dev_lib_cl_%d.so" % len(_BUILD_CACHE))
+    graph, lib, params, dso_binary = _BUILD_CACHE[cache_key]
+
+    if run_on_host:
+        ctx = tvm.opencl(_opencl_device_id())
+        m = graph_runtime.create(graph, lib, ctx)
+    else:
+        from tvm.contrib import ndk
+        remote = _REMOTE
+        ctx = remote.cl(0)
+        if dso_binary not in _UPLOADED:
+            dso_binary_path = _TEMP_DIR.relpath(dso_binary)
+            lib.export_library(dso_binary_path, ndk.create_shared)
+            remote.upload(dso_binary_path)
+            _UPLOADED.add(dso_binary)
+        rlib = remote.load_module(dso_binary)
+        m = graph_runtime.create(graph, rlib, ctx)
+    m.set_input(**params)
+    if not isinstance(input_shape, dict):
+        input_shape = {"data": input_shape}
+    inputs = {key: _random_normal(key, shape, dtype) for key, shape in input_shape.items()}
+    # set by name: unlike set_input(**inputs), this raises on an unknown input
+    for key, data in inputs.items():
+        m.set_input(key, data)
+    m.run()
+
+    if os.environ.get("TVM_TEST_FULL_REF", "0") != "1":
+        check_output_bounds(tvm_mod, params1, inputs, m.get_output(0).asnumpy())
+        return
+
+    ref_outputs = get_reference(tvm_mod, input_shape, inputs, ref_ops)
+    for i, ref_output in enumerate(ref_outputs):
+        tvm_output = m.get_output(i)
+        output = tvm_output.asnumpy()
+        # np.allclose runs in C; assert_allclose only formats its report on failure
+        if not np.allclose(output, ref_output, rtol=1e-2, atol=1e-2):
+            np.testing.assert_allclose(output, ref_output, rtol=1e-2, atol=1e-2)